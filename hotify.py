@@ -1,372 +1,798 @@
-# -*- coding: utf-8 -*-
-#
-# Copyright © by Christof Küstner
-
-"""
-Hotify - Creates hot folder environments based on configuration file
-
-@author: kuestner
-"""
-
-# ==============================================================================
-# IMPORT
-# ==============================================================================
-from typing import List, Union
-import os
-import sys
-from pathlib import Path
-import yaml
-import subprocess
-import shlex
-import time
-import click
-import shutil
-import logging
-from watchdog.observers import Observer
-from watchdog.events import PatternMatchingEventHandler
-import threading
-from queue import Queue
-
-
-# ==============================================================================
-# CONSTANTS
-# ==============================================================================
-HOTIFY_CONFIG = Path(__file__).parent / r"hotify.yml"
-FILE_MODIFICATION_FINISHED_DELAY = 0.2
-
-
-# ==============================================================================
-# INITS
-# ==============================================================================
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
-logging.getLogger("fsevents").disabled = True
-
-
-# ==============================================================================
-# DEFINITION
-# ==============================================================================
-class SetQueue(Queue):
-    def _init(self, maxsize):
-        self.queue = set()
-
-    def _put(self, item):
-        self.queue.add(item)
-
-    def _get(self):
-        return self.queue.pop()
-
-    def get_all(self):
-        result_list = []
-        while not self.empty():
-            result_list.append(self.get())
-
-        return result_list
-
-    def __iter__(self):
-        return self.queue.__iter__()
-
-    def __next__(self):
-        return self.queue.__next__()
-
-    def __len__(self):
-        return self.queue.__len__()
-
-
-class HotifyEventHandler(PatternMatchingEventHandler):
-    def __init__(
-        self, in_pattern, output_folder, multiple_files_delay, trigger, *args, **kwargs
-    ):
-        PatternMatchingEventHandler.__init__(
-            self,
-            patterns=in_pattern,
-            ignore_patterns="",
-            ignore_directories=True,
-            case_sensitive=False,
-            *args,
-            **kwargs,
-        )
-
-        # store parameter
-        self._output_folder = output_folder
-        self._trigger = trigger
-        self._multiple_files_delay = multiple_files_delay
-        self._multiple_input_files_trigger = "in_files" in self._trigger
-
-        # handle in_files which defines the trigger to wait for multiple files,
-        # i.e. delay processing until the folder rested for hotify_input_multiple_files_delay
-        self._multiple_input_files_queue = None
-        self._multiple_files_delay_thread = None
-        if self._multiple_input_files_trigger:
-            self._multiple_files_queue = SetQueue()
-            self._multiple_files_delay_thread = threading.Thread(
-                target=self._delay_trigger,
-                args=(),
-                daemon=True,
-            )
-            self._multiple_files_delay_thread.start()
-
-    def _execute_trigger(self, input_file_paths: Union[Path, list]):
-        if self._multiple_input_files_trigger:  # multiple files as input
-            output_file_path = (
-                self._output_folder / f"multiple--{input_file_paths[0].name}"
-            )
-            in_files_arg = " ".join(
-                f'"{file_path.absolute()}"' for file_path in input_file_paths
-            )
-            trigger_bin_and_args = shlex.split(
-                self._trigger.format(
-                    in_files=in_files_arg,
-                    out_file=output_file_path.absolute(),
-                )
-            )
-        else:
-            output_file_path = self._output_folder / input_file_paths.name
-            trigger_bin_and_args = shlex.split(
-                self._trigger.format(
-                    in_file=input_file_paths.absolute(),
-                    out_file=output_file_path.absolute(),
-                )
-            )
-        # run trigger and handle errors
-        logging.debug(f"EXECUTE-TRIGGER: {trigger_bin_and_args}")
-        try:
-            # TODO: Run trigger in background (in case of compute intensive operations)
-            trigger_process = subprocess.run(
-                trigger_bin_and_args,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-        except Exception as e:
-            logging.error(
-                f"EXECUTE-TRIGGER (FAILED: '{str(e)}'): {trigger_bin_and_args}"
-            )
-        finally:
-            if trigger_process.returncode > 1:
-                logging.error(
-                    f"EXECUTE-TRIGGER (FAILED: returncode > 1): {trigger_bin_and_args}"
-                )
-            else:
-                # TODO: Clean input files, after it was successful
-                pass
-
-    def _delay_trigger(self):
-        q = self._multiple_files_queue
-        trigger = self._execute_trigger
-        delay = self._multiple_files_delay
-
-        while True:
-            if not q.empty():
-                all_input_files_finished = all(
-                    [
-                        abs(time.time() - file_path.stat().st_ctime) > delay
-                        for file_path in q
-                    ]
-                )
-                if all_input_files_finished:
-                    all_input_files = q.get_all()
-                    trigger(input_file_paths=all_input_files)
-            time.sleep(1.0)
-
-    def _wait_until_file_modification_finished(self, file_path: Path):
-        historical_size = -1
-        while historical_size != file_path.stat().st_size:
-            historical_size = file_path.stat().st_size
-            time.sleep(FILE_MODIFICATION_FINISHED_DELAY)
-        logging.debug(f"FILE MODIFICATION FINISHED: {file_path.absolute()}")
-
-    def on_created(self, event):
-        file_created_path = Path(event.src_path)
-        logging.debug(f"FILE CREATED: {file_created_path}")
-        self._wait_until_file_modification_finished(file_created_path)
-        if self._multiple_input_files_trigger:  # multiple files as input
-            self._multiple_files_queue.put(file_created_path)
-        else:
-            self._execute_trigger(input_file_paths=file_created_path)
-
-    def on_modified(self, event):
-        file_modified_path = Path(event.src_path)
-        logging.debug(f"FILE MODIFIED: {file_modified_path}")
-        self._wait_until_file_modification_finished(file_modified_path)
-        if self._multiple_input_files_trigger:  # multiple files as input
-            self._multiple_files_queue.put(file_modified_path)
-        else:
-            self._execute_trigger(input_file_paths=file_modified_path)
-
-
-class HotifyObserver(Observer):
-    def __init__(
-        self,
-        hotify_hot_folder: Path,
-        hotify_output_folder: Path,
-        hotify_input_multiple_files_delay: float,
-        hotify_envs: dict,
-        *args,
-        **kwargs,
-    ):
-        # init Observer super
-        Observer.__init__(self, *args, **kwargs)
-
-        # store parameter
-        self._hotify_hot_folder = hotify_hot_folder
-        self._hotify_output_folder = hotify_output_folder
-        self._hotify_input_multiple_files_delay = hotify_input_multiple_files_delay
-        self._hotify_envs = hotify_envs
-
-        # register environments
-        self.register_environments()
-
-    def register_environments(self, recursively: bool = False):
-        # register all environments in hotify_envs
-        for hotify_env in self._hotify_envs:
-            env_name = hotify_env["name"]
-            env_triggers = hotify_env["trigger"]
-            env_in_pattern = hotify_env["in_pattern"]
-
-            hotify_event_path = self._hotify_hot_folder / env_name
-            hotify_event_path.mkdir(parents=True, exist_ok=True)
-
-            if isinstance(env_triggers, str):  # single trigger
-                self._register_trigger(
-                    hotify_event_path,
-                    env_in_pattern,
-                    self._hotify_output_folder,
-                    env_triggers,
-                    recursively,
-                )
-            else:  # trigger chain
-                for step_i, trigger_i in enumerate(env_triggers):
-                    # define output folder
-                    if step_i < len(env_triggers) - 1:
-                        hotify_event_output_path_i = (
-                            hotify_event_path / f"step_{step_i+1:03d}"
-                        )
-                        hotify_event_output_path_i.mkdir(parents=True, exist_ok=True)
-                    else:
-                        hotify_event_output_path_i = self._hotify_output_folder
-
-                    # first step will become the landing folder (default)
-                    if step_i == 0:
-                        self._register_trigger(
-                            hotify_event_path,
-                            env_in_pattern,
-                            hotify_event_output_path_i,
-                            trigger_i,
-                            False,
-                        )
-                    else:  # all following steps will be separated in order not to trigger default step again
-                        hotify_event_path_i = hotify_event_path / f"step_{step_i:03d}"
-                        hotify_event_path_i.mkdir(parents=True, exist_ok=True)
-                        self._register_trigger(
-                            hotify_event_path_i,
-                            ["*.*"],
-                            hotify_event_output_path_i,
-                            trigger_i,
-                            False,
-                        )
-
-    def _register_trigger(
-        self,
-        event_path: Path,
-        in_pattern: List[str],
-        output_folder: Path,
-        trigger: Union[str, List[str]],
-        recursively: bool,
-    ):
-        hotify_event_handler = HotifyEventHandler(
-            in_pattern=in_pattern,
-            output_folder=output_folder,
-            multiple_files_delay=self._hotify_input_multiple_files_delay,
-            trigger=trigger,
-        )
-        self.schedule(hotify_event_handler, event_path, recursive=recursively)
-
-    def observe(self, initial_run: bool = True, clean_on_exit: bool = True):
-        self.start()
-
-        # initial run by touching all files
-        if initial_run:
-            for folder_item in self._hotify_hot_folder.glob("**/*"):
-                if (
-                    folder_item.is_file()
-                    and folder_item.parent != self._hotify_hot_folder
-                ):
-                    folder_item.touch()
-
-        # do continuously
-        try:
-            while True:
-                time.sleep(0.5)
-        finally:
-            # stop observers
-            self.stop()
-            self.join()
-
-            # clean hot cmd folder
-            if clean_on_exit:
-                logging.debug(
-                    f"CLEANING hotify folder '{self._hotify_hot_folder.absolute()}'!"
-                )
-                shutil.rmtree(self._hotify_hot_folder.absolute())
-
-
-@click.command()
-@click.argument(
-    "base_path",
-    required=False,
-    default=Path("."),
-    type=click.Path(
-        file_okay=False, dir_okay=True, resolve_path=True, allow_dash=False, exists=True
-    ),
-)
-@click.option(
-    "-c",
-    "--clean",
-    "clean_on_exit",
-    is_flag=True,
-    default=False,
-    help="clean: clean folder on exit",
-)
-def hotify(base_path: Path = Path("."), clean_on_exit=False):
-    """
-    Creates hot folder environments in BASE_PATH based on
-    configuration file (hotify.yml) with defined shell commands.
-    """
-    # open and double-check hotify config file
-    with open(HOTIFY_CONFIG.absolute(), "r") as hotify_config_file:
-        hotify_config = yaml.safe_load(hotify_config_file)
-
-    assert "hotify_hot_folder_name" in hotify_config
-    assert "hotify_output_folder_name" in hotify_config
-    assert "hotify_input_multiple_files_delay" in hotify_config
-    assert "hotify_environments" in hotify_config
-
-    # get and generate temporary hotify root/base folder
-    hotify_hot_folder = Path(base_path) / hotify_config["hotify_hot_folder_name"]
-    hotify_hot_folder.mkdir(parents=True, exist_ok=True)
-
-    # get and generate output folder
-    hotify_output_folder = Path(base_path) / hotify_config["hotify_output_folder_name"]
-    hotify_output_folder.mkdir(parents=True, exist_ok=True)
-
-    # read delay in case of "in_files", i.e. multiple files as input for a cmd
-    hotify_input_multiple_files_delay = hotify_config[
-        "hotify_input_multiple_files_delay"
-    ]
-
-    # init hotify observer and its environments from config
-    hotify_observer = HotifyObserver(
-        hotify_hot_folder,
-        hotify_output_folder,
-        hotify_input_multiple_files_delay,
-        hotify_config["hotify_environments"],
-    )
-
-    # observe
-    hotify_observer.observe(clean_on_exit=clean_on_exit)
-
-
-if __name__ == "__main__":
-    hotify()
+# -*- coding: utf-8 -*-
+#
+# Copyright © by Christof Küstner
+
+"""
+Hotify - Creates hot folder environments based on configuration file
+
+@author: kuestner
+"""
+
+# ==============================================================================
+# IMPORT
+# ==============================================================================
+from typing import List, Union
+import os
+import sys
+from pathlib import Path
+import yaml
+import subprocess
+import shlex
+import re
+import fnmatch
+import time
+import click
+import shutil
+import logging
+from watchdog.observers import Observer
+from watchdog.events import (
+    FileCreatedEvent,
+    FileModifiedEvent,
+    FileSystemEventHandler,
+    PatternMatchingEventHandler,
+)
+import asyncio
+import concurrent.futures
+
+try:  # Linux only: used to wait for IN_CLOSE_WRITE instead of stat-polling
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+try:  # libyaml-backed loader parses considerably faster than pure Python
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
+
+
+# ==============================================================================
+# CONSTANTS
+# ==============================================================================
+HOTIFY_CONFIG = Path(__file__).parent / r"hotify.yml"
+FILE_MODIFICATION_FINISHED_DELAY = 0.2
+FILE_CLOSE_EVENT_TIMEOUT = 5.0
+OBSERVER_BACKENDS = ("auto", "inotify", "fsevents", "kqueue", "polling")
+DEFAULT_POLLING_INTERVAL = 1.0
+STAT_CACHE_MAX_ENTRIES = 4096
+MODIFIED_DEBOUNCE_DELAY = 0.25
+MODIFIED_DEBOUNCE_MAX_ENTRIES = 1024
+MULTIPLE_FILES_MAX_BATCH = 1024
+CONFIG_RELOAD_INTERVAL = 10.0
+
+
+# ==============================================================================
+# INITS
+# ==============================================================================
+logging.basicConfig(
+    level=logging.DEBUG,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logging.getLogger("fsevents").disabled = True
+
+
+# ==============================================================================
+# DEFINITION
+# ==============================================================================
+_config_cache = {}  # config path -> (st_mtime, parsed config)
+
+
+def load_hotify_config(config_path: Path = HOTIFY_CONFIG):
+    # parse the config only when its mtime changed since the last call;
+    # otherwise return the cached dict object (the reload timer in observe()
+    # relies on the identity staying stable for unchanged configs)
+    config_key = str(config_path)
+    config_mtime = os.stat(config_key).st_mtime
+    cached = _config_cache.get(config_key)
+    if cached is not None and cached[0] == config_mtime:
+        return cached[1]
+
+    # open and double-check hotify config file
+    with open(config_key, "r") as hotify_config_file:
+        hotify_config = yaml.load(hotify_config_file, Loader=YamlSafeLoader)
+
+    assert "hotify_hot_folder_name" in hotify_config
+    assert "hotify_output_folder_name" in hotify_config
+    assert "hotify_input_multiple_files_delay" in hotify_config
+    assert "hotify_environments" in hotify_config
+
+    _config_cache[config_key] = (config_mtime, hotify_config)
+    return hotify_config
+
+
+def resolve_observer_backend(backend_name: str):
+    # map the configured backend name to the concrete watchdog observer class;
+    # "auto" keeps watchdog's platform auto-selection (FSEvents on macOS,
+    # inotify on Linux, ...); imports are lazy since not every backend module
+    # is importable on every platform
+    assert backend_name in OBSERVER_BACKENDS
+    if backend_name == "inotify":
+        from watchdog.observers.inotify import InotifyObserver
+
+        return InotifyObserver
+    elif backend_name == "fsevents":
+        from watchdog.observers.fsevents import FSEventsObserver
+
+        return FSEventsObserver
+    elif backend_name == "kqueue":
+        from watchdog.observers.kqueue import KqueueObserver
+
+        return KqueueObserver
+    elif backend_name == "polling":
+        from watchdog.observers.polling import PollingObserver
+
+        return PollingObserver
+    return Observer
+
+
+class StatCache:
+    # tiny TTL cache around os.stat() so back-to-back checks of the same path
+    # (condition and body of a poll loop, or a create event immediately
+    # followed by modify events) hit memory instead of issuing a fresh stat
+    # syscall each time; entries are invalidated on incoming file events
+    def __init__(self, ttl: float = FILE_MODIFICATION_FINISHED_DELAY):
+        self._ttl = ttl
+        self._entries = {}
+
+    def stat(self, path) -> os.stat_result:
+        key = str(path)
+        now = time.monotonic()
+        cached = self._entries.get(key)
+        if cached is not None and now - cached[0] < self._ttl:
+            return cached[1]
+        if len(self._entries) > STAT_CACHE_MAX_ENTRIES:
+            self._prune(now)
+        result = os.stat(key, follow_symlinks=False)
+        self._entries[key] = (now, result)
+        return result
+
+    def invalidate(self, path):
+        self._entries.pop(str(path), None)
+
+    def _prune(self, now: float):
+        self._entries = {
+            key: entry
+            for key, entry in self._entries.items()
+            if now - entry[0] < self._ttl
+        }
+
+
+class HotifyEventHandler(PatternMatchingEventHandler):
+    def __init__(
+        self,
+        in_pattern,
+        output_folder,
+        multiple_files_delay,
+        trigger,
+        trigger_pool,
+        *args,
+        **kwargs,
+    ):
+        PatternMatchingEventHandler.__init__(
+            self,
+            patterns=in_pattern,
+            ignore_patterns="",
+            ignore_directories=True,
+            case_sensitive=False,
+            *args,
+            **kwargs,
+        )
+
+        # precompile the in_pattern globs into one case-insensitive regex
+        # union; dispatch() below matches against it instead of watchdog's
+        # per-pattern fnmatch scan on every event
+        self._in_pattern_regex = re.compile(
+            "|".join(fnmatch.translate(pattern) for pattern in in_pattern),
+            re.IGNORECASE,
+        )
+
+        # store parameter; the output folder is resolved once since the cwd
+        # never changes after startup, so per-event abspath()/absolute()
+        # calls on the output side are redundant
+        self._output_folder_abs = os.path.abspath(str(output_folder))
+        self._trigger = trigger
+        self._trigger_pool = trigger_pool
+        self._multiple_files_delay = multiple_files_delay
+        self._multiple_input_files_trigger = "in_files" in self._trigger
+
+        # tokenize the trigger template once and compile a specialized argv
+        # builder for it; multi-file triggers whose {in_files} placeholder is
+        # a token of its own get an argv skeleton the file list is spliced
+        # into per batch — no quote/unquote round-trip through shlex
+        self._trigger_tokens = None
+        self._build_argv = None
+        self._in_files_skeleton = None
+        self._in_files_index = None
+        if not self._multiple_input_files_trigger:
+            self._trigger_tokens = shlex.split(self._trigger)
+            self._build_argv = self._compile_argv_builder()
+        else:
+            skeleton = shlex.split(self._trigger)
+            if "{in_files}" in skeleton:
+                self._in_files_skeleton = skeleton
+                self._in_files_index = skeleton.index("{in_files}")
+
+        # inotify state for close-write waiting (one watch per folder, lazily set up)
+        self._inotify = None
+        self._inotify_watched_folders = set()
+        self._stat_cache = StatCache()
+
+        # per-path debounce state: editors emit bursts of modify events for a
+        # single save; events within MODIFIED_DEBOUNCE_DELAY of the last
+        # handled one for the same path are dropped
+        self._last_handled_ts = {}
+
+        # handle in_files which defines the trigger to wait for multiple files,
+        # i.e. delay processing until the folder rested for
+        # hotify_input_multiple_files_delay; the debouncing runs as an asyncio
+        # task on the observer's event loop (attached via attach_loop), so no
+        # per-handler thread and no lock around the pending batch is needed
+        self._event_loop = None
+        self._async_queue = None
+
+    def _compile_argv_builder(self):
+        # the trigger template is fixed at registration time, so the per-event
+        # placeholder substitution can be collapsed into straight-line code:
+        # constant tokens become literals, placeholder-only tokens become the
+        # bare argument, and only mixed tokens keep a replace() call
+        argv_exprs = []
+        for token in self._trigger_tokens:
+            if token == "{in_file}":
+                argv_exprs.append("in_file")
+            elif token == "{out_file}":
+                argv_exprs.append("out_file")
+            elif "{in_file}" in token or "{out_file}" in token:
+                expr = repr(token)
+                if "{in_file}" in token:
+                    expr += '.replace("{in_file}", in_file)'
+                if "{out_file}" in token:
+                    expr += '.replace("{out_file}", out_file)'
+                argv_exprs.append(expr)
+            else:
+                argv_exprs.append(repr(token))
+        source = "def build_argv(in_file, out_file):\n    return [{}]\n".format(
+            ", ".join(argv_exprs)
+        )
+        namespace = {}
+        exec(compile(source, "<hotify-trigger-codegen>", "exec"), namespace)
+        return namespace["build_argv"]
+
+    def _execute_trigger(self, input_file_paths: Union[str, List[str]]):
+        # paths are handled as plain strings here: this runs per event and
+        # Path construction/flavor dispatch costs add up under bursts;
+        # event paths from watchdog are already absolute, the output folder
+        # was resolved once at init
+        if self._multiple_input_files_trigger:  # multiple files as input
+            output_file_path = os.path.join(
+                self._output_folder_abs,
+                f"multiple--{os.path.basename(input_file_paths[0])}",
+            )
+            if self._in_files_skeleton is not None:
+                # splice the file list into the precomputed argv skeleton
+                skeleton, index = self._in_files_skeleton, self._in_files_index
+                trigger_bin_and_args = (
+                    [
+                        token.replace("{out_file}", output_file_path)
+                        for token in skeleton[:index]
+                    ]
+                    + list(input_file_paths)
+                    + [
+                        token.replace("{out_file}", output_file_path)
+                        for token in skeleton[index + 1 :]
+                    ]
+                )
+            else:
+                # {in_files} is embedded in a larger word (e.g. inside a
+                # quoted shell snippet): keep the quote-and-resplit path
+                in_files_arg = " ".join(
+                    f'"{file_path}"' for file_path in input_file_paths
+                )
+                trigger_bin_and_args = shlex.split(
+                    self._trigger.format(
+                        in_files=in_files_arg,
+                        out_file=output_file_path,
+                    )
+                )
+        else:
+            out_file = os.path.join(
+                self._output_folder_abs, os.path.basename(input_file_paths)
+            )
+            trigger_bin_and_args = self._build_argv(input_file_paths, out_file)
+        # run trigger in background so compute-intensive triggers overlap
+        # instead of serializing all following file events behind one run
+        logging.debug(f"EXECUTE-TRIGGER: {trigger_bin_and_args}")
+        self._trigger_pool.submit(self._run_trigger, trigger_bin_and_args)
+
+    def _run_trigger(self, trigger_bin_and_args: List[str]):
+        # runs on the trigger pool; handles errors
+        try:
+            if hasattr(os, "posix_spawnp"):
+                # spawn directly without the subprocess.Popen machinery
+                # (argument preparation, pipe handling, communicate setup);
+                # all we need is fire, discard output, collect return code
+                pid = os.posix_spawnp(
+                    trigger_bin_and_args[0],
+                    trigger_bin_and_args,
+                    os.environ,
+                    file_actions=[
+                        (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0o644),
+                        (os.POSIX_SPAWN_DUP2, 1, 2),
+                    ],
+                )
+                _, wait_status = os.waitpid(pid, 0)
+                returncode = os.waitstatus_to_exitcode(wait_status)
+            else:  # Windows: posix_spawn is not available
+                returncode = subprocess.run(
+                    trigger_bin_and_args,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                ).returncode
+        except Exception as e:
+            logging.error(
+                f"EXECUTE-TRIGGER (FAILED: '{str(e)}'): {trigger_bin_and_args}"
+            )
+            return
+        if returncode > 1:
+            logging.error(
+                f"EXECUTE-TRIGGER (FAILED: returncode > 1): {trigger_bin_and_args}"
+            )
+        else:
+            # TODO: Clean input files, after it was successful
+            pass
+
+    def attach_loop(self, event_loop):
+        self._event_loop = event_loop
+        self._async_queue = asyncio.Queue()
+
+    def _enqueue_input_file(self, file_path: str):
+        # called from the watchdog dispatcher thread; hand the path over to
+        # the event loop without any lock of our own
+        if self._event_loop is None:
+            return  # not observing yet
+        self._event_loop.call_soon_threadsafe(
+            self._async_queue.put_nowait, file_path
+        )
+
+    def _filter_existing_input_files(self, file_paths: List[str]) -> List[str]:
+        # files can disappear while the batch rests (moved away, cleaned up);
+        # check with one scandir per parent folder instead of one stat
+        # syscall per file
+        files_by_parent = {}
+        for file_path in file_paths:
+            files_by_parent.setdefault(os.path.dirname(file_path), []).append(file_path)
+
+        existing_files = []
+        for parent_folder, parent_file_paths in files_by_parent.items():
+            try:
+                with os.scandir(parent_folder) as folder_entries:
+                    folder_names = {entry.name for entry in folder_entries}
+            except OSError:
+                continue  # folder itself vanished: drop its files
+            existing_files.extend(
+                file_path
+                for file_path in parent_file_paths
+                if os.path.basename(file_path) in folder_names
+            )
+        return existing_files
+
+    async def _delay_trigger(self):
+        trigger = self._execute_trigger
+        delay = self._multiple_files_delay
+
+        pending_files = set()
+        while True:
+            # block until at least one file was enqueued, then collect the
+            # batch until the folder rested: quiescence falls out of the
+            # queue-get timeout (no new file for `delay` seconds); a batch
+            # that reached the bound is flushed immediately so it cannot
+            # grow without limit while files keep arriving
+            pending_files.add(await self._async_queue.get())
+            while len(pending_files) < MULTIPLE_FILES_MAX_BATCH:
+                try:
+                    pending_files.add(
+                        await asyncio.wait_for(self._async_queue.get(), timeout=delay)
+                    )
+                except asyncio.TimeoutError:
+                    break  # folder rested: flush
+            else:
+                logging.debug(f"BATCH FULL ({len(pending_files)} files): flushing")
+            all_input_files = self._filter_existing_input_files(list(pending_files))
+            pending_files.clear()
+            if all_input_files:
+                trigger(input_file_paths=all_input_files)
+
+    def _wait_for_close_write_event(self, file_path: str) -> bool:
+        # block on the inotify fd until the writer closes the file
+        # (IN_CLOSE_WRITE) or it is moved into the folder (IN_MOVED_TO);
+        # one watch per folder, not per file
+        try:
+            if self._inotify is None:
+                self._inotify = INotify()
+            parent_folder = os.path.dirname(file_path)
+            file_name = os.path.basename(file_path)
+            if parent_folder not in self._inotify_watched_folders:
+                self._inotify.add_watch(
+                    parent_folder,
+                    inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO,
+                )
+                self._inotify_watched_folders.add(parent_folder)
+
+            # the file may already have been closed before the watch existed
+            # (watchdog delivers events with a delay), so interleave the event
+            # wait with a size-stability check instead of blocking on the fd
+            # for the full timeout
+            deadline = time.monotonic() + FILE_CLOSE_EVENT_TIMEOUT
+            historical_size = -1
+            while time.monotonic() < deadline:
+                for inotify_event in self._inotify.read(
+                    timeout=FILE_MODIFICATION_FINISHED_DELAY * 1000.0
+                ):
+                    if inotify_event.name == file_name:
+                        return True
+                current_size = os.stat(file_path).st_size
+                if current_size == historical_size:
+                    return True  # size settled: closed before the watch existed
+                historical_size = current_size
+            return False
+        except OSError:
+            return False
+
+    def _wait_until_file_modification_finished(self, file_path: str):
+        if INotify is not None and self._wait_for_close_write_event(file_path):
+            logging.debug(f"FILE MODIFICATION FINISHED: {file_path}")
+            return
+
+        # fallback (non-Linux, network FS, missed event): poll until size
+        # settles; the stat cache collapses the two checks per iteration
+        # (loop condition and body) into one stat syscall
+        historical_size = -1
+        while historical_size != self._stat_cache.stat(file_path).st_size:
+            historical_size = self._stat_cache.stat(file_path).st_size
+            time.sleep(FILE_MODIFICATION_FINISHED_DELAY)
+        logging.debug(f"FILE MODIFICATION FINISHED: {file_path}")
+
+    def dispatch(self, event):
+        # replaces PatternMatchingEventHandler.dispatch: one match against
+        # the precompiled regex union instead of O(patterns) fnmatch calls
+        if event.is_directory:
+            return
+        paths = [event.src_path]
+        dest_path = getattr(event, "dest_path", "")
+        if dest_path:
+            paths.append(dest_path)
+        if any(self._in_pattern_regex.match(path) for path in paths):
+            FileSystemEventHandler.dispatch(self, event)
+
+    def _mark_event_handled(self, file_path: str):
+        if len(self._last_handled_ts) > MODIFIED_DEBOUNCE_MAX_ENTRIES:
+            now = time.monotonic()
+            self._last_handled_ts = {
+                path: ts
+                for path, ts in self._last_handled_ts.items()
+                if now - ts < MODIFIED_DEBOUNCE_DELAY
+            }
+        self._last_handled_ts[file_path] = time.monotonic()
+
+    def on_created(self, event):
+        file_created_path = event.src_path
+        logging.debug(f"FILE CREATED: {file_created_path}")
+        self._stat_cache.invalidate(file_created_path)
+        self._wait_until_file_modification_finished(file_created_path)
+        if self._multiple_input_files_trigger:  # multiple files as input
+            self._enqueue_input_file(file_created_path)
+        else:
+            self._execute_trigger(input_file_paths=file_created_path)
+        self._mark_event_handled(file_created_path)
+
+    def on_modified(self, event):
+        file_modified_path = event.src_path
+        last_handled = self._last_handled_ts.get(file_modified_path, 0.0)
+        if time.monotonic() - last_handled < MODIFIED_DEBOUNCE_DELAY:
+            return  # burst of modify events for a single save
+        logging.debug(f"FILE MODIFIED: {file_modified_path}")
+        self._stat_cache.invalidate(file_modified_path)
+        self._wait_until_file_modification_finished(file_modified_path)
+        if self._multiple_input_files_trigger:  # multiple files as input
+            self._enqueue_input_file(file_modified_path)
+        else:
+            self._execute_trigger(input_file_paths=file_modified_path)
+        self._mark_event_handled(file_modified_path)
+
+
+class HotifyRouterHandler(FileSystemEventHandler):
+    # single handler scheduled once (recursively) on the hot folder root;
+    # dispatches each event to the per-environment handler responsible for
+    # the event's parent folder (env landing folder or step_NNN sub folder),
+    # so only one OS-level watch is needed instead of one per environment/step
+    def __init__(self, root_folder: Path, route_table: dict):
+        self._root_folder = str(root_folder)
+        self._route_table = route_table
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        event_path = event.src_path
+        dest_path = getattr(event, "dest_path", "")
+        if dest_path:
+            # with one recursive watch a move inside the hot tree arrives as
+            # a single moved event instead of an unmatched created event in
+            # the destination folder (which the per-folder watches of the
+            # past saw); route by the destination and hand its handler the
+            # equivalent synthetic created event
+            event = FileCreatedEvent(dest_path)
+            event_path = dest_path
+        route_key = os.path.relpath(os.path.dirname(event_path), self._root_folder)
+        handler = self._route_table.get(route_key)
+        if handler is not None:
+            handler.dispatch(event)
+
+
+class HotifyObserver:
+    def __init__(
+        self,
+        hotify_hot_folder: Path,
+        hotify_output_folder: Path,
+        hotify_input_multiple_files_delay: float,
+        hotify_envs: dict,
+        backend_cls=Observer,
+        polling_interval: float = DEFAULT_POLLING_INTERVAL,
+        config_path: Path = None,
+    ):
+        # init the configured observer backend; for the polling backend the
+        # interval is the poll timeout and trades CPU against event latency
+        from watchdog.observers.polling import PollingObserver
+
+        if backend_cls is PollingObserver:
+            self._observer = backend_cls(timeout=polling_interval)
+        else:
+            self._observer = backend_cls()
+
+        # store parameter
+        self._hotify_hot_folder = hotify_hot_folder
+        self._hotify_output_folder = hotify_output_folder
+        self._hotify_input_multiple_files_delay = hotify_input_multiple_files_delay
+        self._hotify_envs = hotify_envs
+        # when a config path is given, observe() re-reads it periodically and
+        # re-registers the environments and the multiple-files delay on
+        # change (folder names and backend still require a restart)
+        self._config_path = config_path
+
+        # pool for running triggers in the background; threads suffice since
+        # subprocess.run blocks in a C-level wait that releases the GIL
+        self._trigger_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=os.cpu_count()
+        )
+        self._event_loop = None  # created in observe()
+
+        # register environments and watch the hot folder root with a single
+        # recursive watch; events are routed to the per-env handlers in Python
+        self._route_table = self.register_environments()
+        self._router = HotifyRouterHandler(self._hotify_hot_folder, self._route_table)
+        self._observer.schedule(
+            self._router, str(self._hotify_hot_folder), recursive=True
+        )
+
+    def register_environments(self) -> dict:
+        # register all environments in hotify_envs into a fresh route table
+        route_table = {}
+        for hotify_env in self._hotify_envs:
+            env_name = hotify_env["name"]
+            env_triggers = hotify_env["trigger"]
+            env_in_pattern = hotify_env["in_pattern"]
+
+            hotify_event_path = self._hotify_hot_folder / env_name
+            hotify_event_path.mkdir(parents=True, exist_ok=True)
+
+            if isinstance(env_triggers, str):  # single trigger
+                self._register_trigger(
+                    route_table,
+                    hotify_event_path,
+                    env_in_pattern,
+                    self._hotify_output_folder,
+                    env_triggers,
+                )
+            else:  # trigger chain
+                for step_i, trigger_i in enumerate(env_triggers):
+                    # define output folder
+                    if step_i < len(env_triggers) - 1:
+                        hotify_event_output_path_i = (
+                            hotify_event_path / f"step_{step_i+1:03d}"
+                        )
+                        hotify_event_output_path_i.mkdir(parents=True, exist_ok=True)
+                    else:
+                        hotify_event_output_path_i = self._hotify_output_folder
+
+                    # first step will become the landing folder (default)
+                    if step_i == 0:
+                        self._register_trigger(
+                            route_table,
+                            hotify_event_path,
+                            env_in_pattern,
+                            hotify_event_output_path_i,
+                            trigger_i,
+                        )
+                    else:  # all following steps will be separated in order not to trigger default step again
+                        hotify_event_path_i = hotify_event_path / f"step_{step_i:03d}"
+                        hotify_event_path_i.mkdir(parents=True, exist_ok=True)
+                        self._register_trigger(
+                            route_table,
+                            hotify_event_path_i,
+                            ["*.*"],
+                            hotify_event_output_path_i,
+                            trigger_i,
+                        )
+        return route_table
+
+    def _register_trigger(
+        self,
+        route_table: dict,
+        event_path: Path,
+        in_pattern: List[str],
+        output_folder: Path,
+        trigger: Union[str, List[str]],
+    ):
+        hotify_event_handler = HotifyEventHandler(
+            in_pattern=in_pattern,
+            output_folder=output_folder,
+            multiple_files_delay=self._hotify_input_multiple_files_delay,
+            trigger=trigger,
+            trigger_pool=self._trigger_pool,
+        )
+        route_key = str(event_path.relative_to(self._hotify_hot_folder))
+        route_table[route_key] = hotify_event_handler
+
+    def _start_delay_workers(self):
+        for handler in self._route_table.values():
+            if handler._multiple_input_files_trigger and handler._event_loop is None:
+                handler.attach_loop(self._event_loop)
+                self._delay_tasks.append(
+                    self._event_loop.create_task(handler._delay_trigger())
+                )
+
+    async def _reload_config_timer(self):
+        while True:
+            await asyncio.sleep(CONFIG_RELOAD_INTERVAL)
+            try:
+                hotify_config = load_hotify_config(self._config_path)
+            except Exception as e:
+                logging.error(f"CONFIG RELOAD FAILED: '{str(e)}'")
+                continue
+            hotify_envs = hotify_config["hotify_environments"]
+            if hotify_envs is self._hotify_envs:
+                continue  # cache hit: config unchanged
+            logging.debug("CONFIG CHANGED: re-registering environments")
+            self._hotify_envs = hotify_envs
+            self._hotify_input_multiple_files_delay = hotify_config[
+                "hotify_input_multiple_files_delay"
+            ]
+            for delay_task in self._delay_tasks:
+                delay_task.cancel()
+            self._delay_tasks.clear()
+            # build the new table aside and swap it into the dict the router
+            # keeps referencing, so the dispatcher thread reading it
+            # concurrently sees at most a brief gap instead of a half-built
+            # table
+            new_route_table = self.register_environments()
+            self._route_table.clear()
+            self._route_table.update(new_route_table)
+            self._start_delay_workers()
+
+    def observe(self, initial_run: bool = True, clean_on_exit: bool = True):
+        # one event loop in the main thread drives the multi-file debouncers
+        # and the config reload timer; watchdog callbacks cross over via
+        # call_soon_threadsafe
+        self._event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._event_loop)
+        self._delay_tasks = []
+        self._start_delay_workers()
+        reload_task = None
+        if self._config_path is not None:
+            reload_task = self._event_loop.create_task(self._reload_config_timer())
+
+        self._observer.start()
+
+        # initial run by dispatching all existing files directly to their
+        # environment handlers (no touch(): that caused one write syscall,
+        # one mtime update and a full watchdog event cascade per file);
+        # os.walk already separates files from folders via scandir, so no
+        # per-entry is_file()/is_dir() stats as with pathlib's "**/*" glob
+        if initial_run:
+            hot_folder_root = str(self._hotify_hot_folder)
+            for folder_path, _, file_names in os.walk(hot_folder_root):
+                if folder_path == hot_folder_root:
+                    continue  # files directly in the hot folder root have no env
+                for file_name in file_names:
+                    self._router.dispatch(
+                        FileModifiedEvent(os.path.join(folder_path, file_name))
+                    )
+
+        # do continuously
+        try:
+            self._event_loop.run_forever()
+        finally:
+            # wind down the debouncers, the reload timer and the loop
+            loop_tasks = list(self._delay_tasks)
+            if reload_task is not None:
+                loop_tasks.append(reload_task)
+            for loop_task in loop_tasks:
+                loop_task.cancel()
+            self._event_loop.run_until_complete(
+                asyncio.gather(*loop_tasks, return_exceptions=True)
+            )
+            self._event_loop.close()
+
+            # stop observers and let running triggers finish
+            self._observer.stop()
+            self._observer.join()
+            self._trigger_pool.shutdown(wait=True)
+
+            # clean hot cmd folder
+            if clean_on_exit:
+                logging.debug(
+                    f"CLEANING hotify folder '{self._hotify_hot_folder.absolute()}'!"
+                )
+                shutil.rmtree(self._hotify_hot_folder.absolute())
+
+
+@click.command()
+@click.argument(
+    "base_path",
+    required=False,
+    default=Path("."),
+    type=click.Path(
+        file_okay=False, dir_okay=True, resolve_path=True, allow_dash=False, exists=True
+    ),
+)
+@click.option(
+    "-c",
+    "--clean",
+    "clean_on_exit",
+    is_flag=True,
+    default=False,
+    help="clean: clean folder on exit",
+)
+def hotify(base_path: Path = Path("."), clean_on_exit=False):
+    """
+    Creates hot folder environments in BASE_PATH based on
+    configuration file (hotify.yml) with defined shell commands.
+    """
+    # open and double-check hotify config file
+    hotify_config = load_hotify_config(HOTIFY_CONFIG)
+
+    # get and generate temporary hotify root/base folder
+    hotify_hot_folder = Path(base_path) / hotify_config["hotify_hot_folder_name"]
+    hotify_hot_folder.mkdir(parents=True, exist_ok=True)
+
+    # get and generate output folder
+    hotify_output_folder = Path(base_path) / hotify_config["hotify_output_folder_name"]
+    hotify_output_folder.mkdir(parents=True, exist_ok=True)
+
+    # read delay in case of "in_files", i.e. multiple files as input for a cmd
+    hotify_input_multiple_files_delay = hotify_config[
+        "hotify_input_multiple_files_delay"
+    ]
+
+    # read observer backend (optional, default: watchdog auto-selection)
+    observer_backend_cls = resolve_observer_backend(
+        hotify_config.get("hotify_observer_backend", "auto")
+    )
+    observer_polling_interval = hotify_config.get(
+        "hotify_polling_interval", DEFAULT_POLLING_INTERVAL
+    )
+
+    # init hotify observer and its environments from config
+    hotify_observer = HotifyObserver(
+        hotify_hot_folder,
+        hotify_output_folder,
+        hotify_input_multiple_files_delay,
+        hotify_config["hotify_environments"],
+        backend_cls=observer_backend_cls,
+        polling_interval=observer_polling_interval,
+        config_path=HOTIFY_CONFIG,
+    )
+
+    # observe
+    hotify_observer.observe(clean_on_exit=clean_on_exit)
+
+
+if __name__ == "__main__":
+    hotify()